@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+"""measure the overhead of hooked Sprite methods
+
+Compares the hook dispatch of call_hook_method against the previous
+implementation, which looked the hook up with getattr on every call.
+Runs headless: python benchmarks/bench_hooks.py
+"""
+
+import os
+import timeit
+from functools import wraps
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+# Import new sprite class
+parentdir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+os.sys.path.insert(0, parentdir)
+from sprite import *
+
+NUMBER = 200000
+
+
+def legacy_call_hook_method(hook_name):
+    """the hook decorator as it was before hooks were cached per class
+    """
+    def on_call(method):
+        @wraps(method)
+        def wrapped(self, *args, **kwargs):
+            hook = getattr(self, hook_name, None)
+            if hook:
+                if hook(method, *args, **kwargs):
+                    return method(self, *args, **kwargs)
+        return wrapped
+    return on_call
+
+
+class LegacySprite(Sprite):
+    move_to = legacy_call_hook_method('on_visual_change')(
+        Sprite.move_to.__wrapped__)
+    move_by = legacy_call_hook_method('on_visual_change')(
+        Sprite.move_by.__wrapped__)
+
+
+class BareSprite(Sprite):
+    """unhooked methods, the lower bound for the hooked ones"""
+    move_to = Sprite.move_to.__wrapped__
+
+    def move_by(self, delta):
+        (delta_x, delta_y) = delta
+        (current_x, current_y) = self.position
+        self.move_to((current_x + delta_x, current_y + delta_y))
+
+
+def make(cls):
+    spr = cls()
+    spr.set_image(pygame.Surface((10, 10)))
+    spr.move_to((0, 0))
+    return spr
+
+
+def per_call(stmt, spr):
+    timer = timeit.Timer(stmt, globals={'spr': spr})
+    return min(timer.repeat(5, NUMBER)) / NUMBER * 1e9
+
+
+def main():
+    print("%-10s %10s %10s %10s" % ("method", "bare", "legacy", "current"))
+    for (name, stmt) in (('move_to', 'spr.move_to((1, 2))'),
+                         ('move_by', 'spr.move_by((1, 2))')):
+        results = [per_call(stmt, make(cls))
+                   for cls in (BareSprite, LegacySprite, Sprite)]
+        print("%-10s %8.0fns %8.0fns %8.0fns" % ((name,) + tuple(results)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,492 @@
+#!/usr/bin/env python
+"""benchmark the sprite and group hot paths
+
+Runs headless (SDL_VIDEODRIVER=dummy) and times the common Sprite,
+AbstractGroup and AggregatedSprite operations over groups of various
+sizes. Results can be written as JSON and compared between commits:
+
+    python benchmarks/bench_sprite.py --output before.json
+    (change sprite.py)
+    python benchmarks/bench_sprite.py --output after.json --compare before.json
+"""
+
+import os
+import sys
+import json
+import random
+import time
+import platform
+import argparse
+import subprocess
+from timeit import default_timer
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+# Import new sprite class
+parentdir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+os.sys.path.insert(0, parentdir)
+from sprite import *
+
+SIZES = [100, 1000, 10000, 100000]
+SCREEN_SIZE = 1000
+IMAGE_SIZE = 8
+
+benchmarks = []
+
+
+def benchmark(name):
+    """register a benchmark
+
+    The decorated function takes the number of sprites and returns a
+    function that runs one timed pass. Setup work goes in the outer
+    function; benchmarks changing the group should undo it in the pass
+    or be cheap to repeat.
+    """
+    def register(func):
+        benchmarks.append((name, func))
+        return func
+    return register
+
+
+def make_sprites(n):
+    image = pygame.Surface((IMAGE_SIZE, IMAGE_SIZE))
+    sprites = []
+    for i in range(n):
+        spr = Sprite()
+        spr.set_image(image)
+        spr.move_to(((i * 7) % SCREEN_SIZE, (i * 13) % SCREEN_SIZE))
+        sprites.append(spr)
+    return sprites
+
+
+@benchmark('Sprite.move_to')
+def bench_move_to(n):
+    sprites = make_sprites(n)
+
+    def run():
+        for spr in sprites:
+            spr.move_to((10, 20))
+    return run
+
+
+@benchmark('Sprite.move_by')
+def bench_move_by(n):
+    sprites = make_sprites(n)
+
+    def run():
+        for spr in sprites:
+            spr.move_by((1, -1))
+    return run
+
+
+@benchmark('Sprite.scale_to')
+def bench_scale_to(n):
+    sprites = make_sprites(n)
+    state = {'scale': 1}
+
+    def run():
+        state['scale'] = scale = 3 - state['scale']
+        for spr in sprites:
+            spr.scale_to(scale)
+    return run
+
+
+@benchmark('Sprite.rotate_to')
+def bench_rotate_to(n):
+    sprites = make_sprites(n)
+    state = {'angle': 0}
+
+    def run():
+        state['angle'] = angle = (state['angle'] + 15) % 360
+        for spr in sprites:
+            spr.rotate_to(angle)
+    return run
+
+
+@benchmark('AbstractGroup.add')
+def bench_add(n):
+    sprites = make_sprites(n)
+    group = Group()
+
+    def run():
+        group.add(sprites)
+        group.empty()
+    return run
+
+
+@benchmark('AbstractGroup.remove')
+def bench_remove(n):
+    sprites = make_sprites(n)
+    group = Group()
+
+    def run():
+        group.add(sprites)
+        group.remove(sprites)
+    return run
+
+
+@benchmark('AbstractGroup.add_many')
+def bench_add_many(n):
+    sprites = make_sprites(n)
+    group = Group()
+
+    def run():
+        group.add_many(sprites)
+        group.remove_many(sprites)
+    return run
+
+
+def make_wave(n):
+    """a group of n sprites and a wave of n // 4 more to add to it"""
+    group = Group(make_sprites(n))
+    group.sprites()
+    return group, make_sprites(max(n // 4, 1))
+
+
+@benchmark('AbstractGroup.add wave')
+def bench_add_wave(n):
+    group, wave = make_wave(n)
+
+    def run():
+        group.add(wave)
+        group.remove(wave)
+    return run
+
+
+@benchmark('AbstractGroup.add_many wave')
+def bench_add_many_wave(n):
+    group, wave = make_wave(n)
+
+    def run():
+        group.add_many(wave)
+        group.remove_many(wave)
+    return run
+
+
+@benchmark('AbstractGroup.change_layer')
+def bench_change_layer(n):
+    sprites = make_sprites(n)
+    group = Group(sprites)
+
+    def run():
+        # re-layer by y, as an isometric renderer would, then draw order
+        for spr in sprites:
+            spr.layer = spr.rect.y
+            spr.move_by((0, 1))
+        group.sprites()
+    return run
+
+
+@benchmark('AbstractGroup.has')
+def bench_has(n):
+    sprites = make_sprites(n)
+    group = Group(sprites)
+
+    def run():
+        group.has(sprites)
+    return run
+
+
+@benchmark('AbstractGroup.sprites')
+def bench_sprites(n):
+    group = Group(make_sprites(n))
+
+    def run():
+        group.sprites()
+    return run
+
+
+@benchmark('AbstractGroup.draw')
+def bench_draw(n):
+    group = Group(make_sprites(n))
+    screen = pygame.Surface((SCREEN_SIZE, SCREEN_SIZE))
+
+    def run():
+        group.draw(screen)
+    return run
+
+
+@benchmark('AbstractGroup.clear')
+def bench_clear(n):
+    group = Group(make_sprites(n))
+    screen = pygame.Surface((SCREEN_SIZE, SCREEN_SIZE))
+    background = pygame.Surface((SCREEN_SIZE, SCREEN_SIZE))
+    group.draw(screen)
+
+    def run():
+        group.clear(screen, background)
+    return run
+
+
+@benchmark('AbstractGroup.clear scattered')
+def bench_clear_scattered(n):
+    # small sprites spread over a large area, few of them overlapping
+    image = pygame.Surface((4, 4))
+    group = Group()
+    for i in range(n):
+        spr = Sprite()
+        spr.set_image(image)
+        spr.move_to(((i * 7919) % 4000, (i * 104729) % 4000))
+        group.add(spr)
+    screen = pygame.Surface((4000, 4000))
+    background = pygame.Surface((4000, 4000))
+    group.draw(screen)
+
+    def run():
+        group.clear(screen, background)
+    return run
+
+
+def make_swarm(n):
+    """a drawn group of n 64x64 sprites overlapping around one spot"""
+    image = pygame.Surface((64, 64))
+    rng = random.Random(1)
+    group = Group()
+    for i in range(n):
+        spr = Sprite()
+        spr.set_image(image)
+        spr.move_to((rng.randrange(200), rng.randrange(200)))
+        group.add(spr)
+    screen = pygame.Surface((SCREEN_SIZE, SCREEN_SIZE))
+    group.draw(screen)
+    return group, screen
+
+
+@benchmark('AbstractGroup.clear dense')
+def bench_clear_dense(n):
+    group, screen = make_swarm(n)
+    background = screen.copy()
+
+    def run():
+        group.clear(screen, background)
+    return run
+
+
+@benchmark('AbstractGroup.clear dense merged')
+def bench_clear_dense_merged(n):
+    group, screen = make_swarm(n)
+    group.clear_waste = 0.25
+    background = screen.copy()
+
+    def run():
+        group.clear(screen, background)
+    return run
+
+
+@benchmark('DirtyGroup.draw')
+def bench_dirty_draw(n):
+    # every sprite moves, so the whole group is damaged each frame
+    sprites = make_sprites(n)
+    group = DirtyGroup(sprites)
+    screen = pygame.Surface((SCREEN_SIZE, SCREEN_SIZE))
+    background = pygame.Surface((SCREEN_SIZE, SCREEN_SIZE))
+    group.draw(screen, background)
+    state = {'dx': 1}
+
+    def run():
+        state['dx'] = dx = -state['dx']
+        for spr in sprites:
+            spr.move_by((dx, 0))
+        group.draw(screen, background)
+    return run
+
+
+@benchmark('DirtyGroup.draw static')
+def bench_dirty_draw_static(n):
+    # a mostly static scene: two sprites move each frame
+    sprites = make_sprites(n)
+    group = DirtyGroup(sprites)
+    screen = pygame.Surface((SCREEN_SIZE, SCREEN_SIZE))
+    background = pygame.Surface((SCREEN_SIZE, SCREEN_SIZE))
+    group.draw(screen, background)
+    state = {'dx': 1}
+
+    def run():
+        state['dx'] = dx = -state['dx']
+        for spr in sprites[:2]:
+            spr.move_by((dx, 0))
+        group.draw(screen, background)
+    return run
+
+
+@benchmark('DirtyGroup.draw dense')
+def bench_dirty_draw_dense(n):
+    # a swarm of overlapping sprites, all moving
+    swarm, screen = make_swarm(n)
+    sprites = swarm.sprites()
+    group = DirtyGroup(sprites)
+    background = screen.copy()
+    group.draw(screen, background)
+    state = {'dx': 1}
+
+    def run():
+        state['dx'] = dx = -state['dx']
+        for spr in sprites:
+            spr.move_by((dx, 0))
+        group.draw(screen, background)
+    return run
+
+
+@benchmark('Group.draw repaint')
+def bench_repaint(n):
+    # the full repaint DirtyGroup competes with, without moving sprites
+    group = Group(make_sprites(n))
+    screen = pygame.Surface((SCREEN_SIZE, SCREEN_SIZE))
+    background = pygame.Surface((SCREEN_SIZE, SCREEN_SIZE))
+
+    def run():
+        screen.blit(background, (0, 0))
+        group.draw(screen)
+    return run
+
+
+@benchmark('AggregatedSprite.move_to')
+def bench_aggregated(n):
+    aggregate = AggregatedSprite()
+    for spr in make_sprites(n):
+        aggregate.add_sprite(spr)
+    state = {'x': 0}
+
+    def run():
+        state['x'] = x = 1 - state['x']
+        aggregate.move_to((x, x))
+    return run
+
+
+@benchmark('groupcollide')
+def bench_groupcollide(n):
+    groupa = Group(make_sprites(n))
+    groupb = Group(make_sprites(n)[::-1])
+    sweep = CollisionSweep()
+
+    def run():
+        groupcollide(groupa, groupb, sweep=sweep)
+    return run
+
+
+@benchmark('groupcollide tall field')
+def bench_groupcollide_tall(n):
+    # a vertical shooter: a narrow field, many times taller than wide
+    def column(n, seed):
+        rand = random.Random(seed)
+        sprites = make_sprites(n)
+        for spr in sprites:
+            spr.move_to((rand.randrange(200), rand.randrange(n // 2 + 1)))
+        return Group(sprites)
+    groupa = column(n, 1)
+    groupb = column(n, 2)
+    sweep = CollisionSweep()
+
+    def run():
+        groupcollide(groupa, groupb, sweep=sweep)
+    return run
+
+
+@benchmark('Tweener.step')
+def bench_tweener(n):
+    sprites = make_sprites(n)
+    tweener = Tweener()
+
+    def run():
+        if not len(tweener):
+            for spr in sprites:
+                tweener.tween(spr, 'position', (500, 500), 1000)
+        tweener.step(1)
+    return run
+
+
+def measure(func, n, repeat):
+    """return the best time of repeat passes of a benchmark, in seconds
+    """
+    run = func(n)
+    run()  # warm up caches
+    best = None
+    for i in range(repeat):
+        start = default_timer()
+        run()
+        elapsed = default_timer() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=parentdir,
+            stderr=subprocess.STDOUT).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(sizes, repeat, selected):
+    results = []
+    for (name, func) in benchmarks:
+        if selected and not any(s in name for s in selected):
+            continue
+        if name.startswith('Tweener') and numpy is None:
+            continue
+        for n in sizes:
+            seconds = measure(func, n, repeat)
+            results.append({
+                'name': name,
+                'size': n,
+                'seconds': seconds,
+                'per_sprite_ns': seconds / n * 1e9,
+            })
+            print("%-30s %7d %12.3fms %10.0fns/sprite"
+                  % (name, n, seconds * 1e3, seconds / n * 1e9))
+            sys.stdout.flush()
+    return {
+        'meta': {
+            'revision': git_revision(),
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'implementation': platform.python_implementation(),
+            'pygame': pygame.version.ver,
+            'platform': platform.platform(),
+            'repeat': repeat,
+        },
+        'results': results,
+    }
+
+
+def compare(report, baseline):
+    """print the time ratio of each result against a baseline report
+    """
+    base = dict(((r['name'], r['size']), r['seconds'])
+                for r in baseline['results'])
+    print("\ncompared to %s (ratio < 1 is faster):"
+          % (baseline['meta'].get('revision') or 'baseline'))
+    for r in report['results']:
+        before = base.get((r['name'], r['size']))
+        if before:
+            print("%-30s %7d %8.2fx" % (r['name'], r['size'],
+                                        r['seconds'] / before))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=SIZES,
+                        help='group sizes to run (default: %(default)s)')
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='timed passes per benchmark, best is kept')
+    parser.add_argument('--only', nargs='+', default=None,
+                        help='run benchmarks whose name contains these')
+    parser.add_argument('--output', help='write the results as JSON')
+    parser.add_argument('--compare', help='JSON results to compare against')
+    args = parser.parse_args()
+
+    pygame.init()
+    report = run_benchmarks(args.sizes, args.repeat, args.only)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(report, json.load(f))
+    pygame.quit()
+
+
+if __name__ == '__main__':
+    main()
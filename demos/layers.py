@@ -3,7 +3,6 @@
 import os
 import pygame
 from pygame.locals import *
-from pygame.compat import geterror
 
 # Import new sprite class
 parentdir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -13,6 +12,9 @@ from sprite import *
 main_dir = os.path.split(os.path.abspath(__file__))[0]
 data_dir = os.path.join(main_dir, 'data')
 
+# images are loaded once and shared by all sprites using them
+Sprite.assets = AssetManager(data_dir)
+
 SCREEN_SIZE = 700
 
 colors = {
@@ -20,25 +22,10 @@ colors = {
 }
 
 
-def load_image(name, colorkey=None):
-    fullname = os.path.join(data_dir, name)
-    try:
-        image = pygame.image.load(fullname)
-    except pygame.error:
-        print ("Cannot load image:", fullname)
-        raise SystemExit(str(geterror()))
-    image = image.convert()
-    if colorkey is not None:
-        if colorkey is -1:
-            colorkey = image.get_at((0, 0))
-        image.set_colorkey(colorkey, RLEACCEL)
-    return image, image.get_rect()
-
-
 class Thing(Sprite):
     def __init__(self, filename):
         Sprite.__init__(self)
-        self.image, self.rect = load_image(filename + ".png", -1)
+        self.load_image(filename + ".png", -1)
 
 
 def main():
@@ -84,8 +71,6 @@ def main():
                             ball.layer = 3
                             button.layer = 1
                             teddy.layer = 2
-                        all.remove((ball, button, teddy))
-                        all.add((ball, button, teddy))
                     elif event.key in quit_keys:  # quit game
                         return
 
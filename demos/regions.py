@@ -3,7 +3,6 @@
 import os
 import pygame
 from pygame.locals import *
-from pygame.compat import geterror
 
 # Import new sprite class
 parentdir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -17,6 +16,9 @@ if not pygame.font:
 main_dir = os.path.split(os.path.abspath(__file__))[0]
 data_dir = os.path.join(main_dir, 'data')
 
+# images are loaded once and shared by all sprites using them
+Sprite.assets = AssetManager(data_dir)
+
 SCREENSIZE = 700
 REGIONSROW = 7
 REGIONSROWIZE = SCREENSIZE / REGIONSROW
@@ -27,25 +29,10 @@ colors = {
 }
 
 
-def load_image(name, colorkey=None):
-    fullname = os.path.join(data_dir, name)
-    try:
-        image = pygame.image.load(fullname)
-    except pygame.error:
-        print ("Cannot load image:", fullname)
-        raise SystemExit(str(geterror()))
-    image = image.convert()
-    if colorkey is not None:
-        if colorkey is -1:
-            colorkey = image.get_at((0, 0))
-        image.set_colorkey(colorkey, RLEACCEL)
-    return image
-
-
 class Ball(Sprite):
     def __init__(self, regions):
         Sprite.__init__(self)
-        self.set_image(load_image("ball.png", -1))
+        self.load_image("ball.png", -1)
         self.regions = regions
         self.current_region = 0
         self.draw_in_region()
@@ -3,7 +3,6 @@
 import os
 import pygame
 from pygame.locals import *
-from pygame.compat import geterror
 
 # Import new sprite class
 parentdir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -13,6 +12,9 @@ from sprite import *
 main_dir = os.path.split(os.path.abspath(__file__))[0]
 data_dir = os.path.join(main_dir, 'data')
 
+# images are loaded once and shared by all sprites using them
+Sprite.assets = AssetManager(data_dir)
+
 SCREEN_SIZE = 700
 SCREEN_CENTER = (SCREEN_SIZE / 2, SCREEN_SIZE / 2)
 SCALE_STEP = 0.1
@@ -26,21 +28,6 @@ colors = {
 }
 
 
-def load_image(name, colorkey=None):
-    fullname = os.path.join(data_dir, name)
-    try:
-        image = pygame.image.load(fullname)
-    except pygame.error:
-        print ("Cannot load image:", fullname)
-        raise SystemExit(str(geterror()))
-    image = image.convert()
-    if colorkey is not None:
-        if colorkey is -1:
-            colorkey = image.get_at((0, 0))
-        image.set_colorkey(colorkey, RLEACCEL)
-    return image
-
-
 def draw_squares(screen):
     line_length = 5
     for size in [100, 250, 500]:
@@ -61,7 +48,7 @@ def draw_squares(screen):
 class Ball(Sprite):
     def __init__(self):
         Sprite.__init__(self)
-        self.set_image(load_image("ball.png", -1))
+        self.load_image("ball.png", -1)
         self.anchor = ANCHOR_CENTER
 
 
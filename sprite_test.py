@@ -2,6 +2,13 @@ import unittest
 import pygame
 from pygame.locals import *
 import os
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 # Import new sprite class
 parentdir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -34,6 +41,29 @@ class SpriteTests(unittest.TestCase):
         self.s1.move_by((3, 3))
         self.assertEqual(self.s1.position, (5, 7))
 
+    def test_float_position(self):
+        self.s1.set_image(pygame.Surface((10, 10)))
+        self.s1.move_to((0, 0))
+        for i in range(4):
+            self.s1.move_by((0.3, 0.6))
+        self.assertAlmostEqual(self.s1.position[0], 1.2)
+        self.assertEqual(self.s1.rect.topleft, (1, 2))
+
+    def test_anchor(self):
+        self.s1.set_image(pygame.Surface((10, 20)))
+        self.s1.move_to((50, 50))
+        self.s1.anchor = ANCHOR_BOTTOMRIGHT
+        self.s1.move_to((50, 50))
+        self.assertEqual(self.s1.rect.topleft, (40, 30))
+        self.s1.scale_to(2)
+        self.assertEqual(self.s1.rect.topleft, (30, 10))
+        self.s1.anchor = ANCHOR_CENTER
+        self.s1.move_to((50, 50))
+        self.assertEqual(self.s1.rect.center, (50, 50))
+        self.s1.anchor = (5, 5)
+        self.s1.move_to((50, 50))
+        self.assertEqual(self.s1.rect.topleft, (45, 45))
+
     def test_set_image(self):
         self.s1.set_image(pygame.Surface((10, 10)))
         self.assertEqual(self.s1.rect.size, (10, 10))
@@ -112,6 +142,107 @@ class SpriteTests(unittest.TestCase):
         self.s1.scale_to(0.7)
         self.assertEqual(self.s1.rect.size, ((7, 7)))
 
+    def test_hook_calls(self):
+        calls = []
+
+        class Hooked(Sprite):
+            def on_visual_change(self, method, *args, **kwargs):
+                calls.append(method.__name__)
+                return method.__name__ != 'make_invisible'
+
+        s = Hooked()
+        s.set_image(pygame.Surface((10, 10)))
+        s.move_to((0, 0))
+        s.move_by((1, 1))
+        self.assertEqual(calls, ['set_image', 'move_to', 'move_by'])
+        self.assertEqual(s.position, (1, 1))
+        s.make_invisible()
+        self.assertTrue(s.visible)
+
+    def test_hook_non_sprite(self):
+        class Plain(object):
+            def on_change(self, method, *args, **kwargs):
+                self.calls += 1
+                return True
+
+            @call_hook_method('on_change')
+            def set_value(self, value):
+                self.value = value
+
+        p = Plain()
+        p.calls = 0
+        p.set_value(3)
+        self.assertEqual((p.value, p.calls), (3, 1))
+
+    def test_batch(self):
+        self.s1.transform_cache = TransformCache()
+        self.s1.set_image(pygame.Surface((10, 10)))
+        self.s1.anchor = ANCHOR_CENTER
+        self.s1.move_to((50, 50))
+        self.s1.dirty = False
+        with self.s1.batch():
+            self.s1.scale_to(2)
+            self.s1.rotate_to(90)
+            self.s1.move_by((10, 10))
+            self.assertEqual(self.s1.rect, Rect(45, 45, 10, 10))
+            self.assertFalse(self.s1.dirty)
+        self.assertEqual(self.s1.rect, Rect(50, 50, 20, 20))
+        self.assertEqual(self.s1.transform_cache.misses, 1)
+        self.assertTrue(self.s1.dirty)
+
+    def test_batch_without_original(self):
+        self.s1.image = pygame.Surface((10, 10))
+        self.s1.rect = self.s1.image.get_rect()
+        with self.s1.batch():
+            self.s1.move_to((20, 20))
+            self.s1.rotate_to(90)
+        self.assertEqual(self.s1.rect, Rect(20, 20, 10, 10))
+
+    def test_group_batch(self):
+        self.s1.set_image(pygame.Surface((10, 10)))
+        s2 = Sprite()
+        s2.set_image(pygame.Surface((10, 10)))
+        s2.move_to((0, 0))
+        group = Group(self.s1, s2)
+        with group.batch():
+            for spr in group:
+                spr.scale_to(2)
+                spr.move_by((5, 5))
+            self.assertEqual(s2.rect, Rect(0, 0, 10, 10))
+        self.assertEqual(self.s1.rect, Rect(5, 5, 20, 20))
+        self.assertEqual(s2.rect, Rect(5, 5, 20, 20))
+
+    def test_rotation_steps(self):
+        img = pygame.Surface((10, 20))
+        self.s1.set_image(img)
+        self.s1.set_rotation_steps(8, build=True)
+        atlas = rotation_atlas(img, (10, 20), 8)
+        self.assertEqual(len([f for f in atlas.frames if f is not None]), 8)
+        self.s1.rotate_to(80)
+        self.assertEqual(self.s1.rotate, 80)
+        self.assertTrue(self.s1.image is atlas.frames[2])
+        self.assertEqual(self.s1.rect.size, (20, 10))
+        s2 = Sprite()
+        s2.set_image(img)
+        s2.set_rotation_steps(8)
+        s2.rotate_to(-265)
+        self.assertTrue(s2.image is self.s1.image)
+        self.s1.set_rotation_steps(None)
+        self.assertFalse(self.s1.image is atlas.frames[2])
+
+    def test_rotation_atlas_limit(self):
+        img = pygame.Surface((10, 10))
+        self.s1.set_image(img)
+        self.s1.set_rotation_steps(8)
+        self.s1.rotate_to(45)
+        first = rotation_atlas(img, (10, 10), 8)
+        for i in range(ATLASES_PER_IMAGE):
+            self.s1.scale_to(2 + i)
+        # the atlases of the recent sizes are kept, the oldest is dropped
+        latest = rotation_atlas(img, self.s1.scaled_size(), 8)
+        self.assertTrue(self.s1.image is latest.frame_at(45))
+        self.assertFalse(rotation_atlas(img, (10, 10), 8) is first)
+
     def test_scale_by(self):
         self.s1.set_image(pygame.Surface((10, 10)))
         self.assertEqual(self.s1.rect.size, ((10, 10)))
@@ -123,6 +254,160 @@ class SpriteTests(unittest.TestCase):
         self.assertEqual(self.s1.rect.size, ((27, 27)))
 
 
+class SlotSpriteTests(unittest.TestCase):
+    def test_no_dict(self):
+        s = SlotSprite()
+        self.assertFalse(hasattr(s, '__dict__'))
+        self.assertRaises(AttributeError, setattr, s, 'foo', 1)
+
+    def test_api(self):
+        g = Group()
+        s = SlotSprite(g)
+        self.assertTrue(s in g)
+        self.assertEqual(s.groups(), [g])
+        s.set_image(pygame.Surface((10, 10)))
+        s.move_to((5, 5))
+        s.scale_to(2)
+        self.assertEqual(s.rect, Rect(5, 5, 20, 20))
+        self.assertTrue(s.dirty)
+        s.kill()
+        self.assertFalse(s.alive())
+        self.assertEqual(len(g), 0)
+
+    def test_weakref(self):
+        s = SlotSprite()
+        self.assertTrue(weakref.ref(s)() is s)
+
+
+class TransformCacheTests(unittest.TestCase):
+    def setUp(self):
+        self.cache = TransformCache()
+
+    def test_hit_miss(self):
+        img = pygame.Surface((10, 10))
+        a = self.cache.get(img, (20, 20), 90)
+        self.assertEqual(a.get_size(), (20, 20))
+        self.assertEqual((self.cache.hits, self.cache.misses), (0, 1))
+        b = self.cache.get(img, (20, 20), 90)
+        self.assertTrue(a is b)
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+        self.cache.get(pygame.Surface((10, 10)), (20, 20), 90)
+        self.assertEqual(self.cache.misses, 2)
+
+    def test_eviction(self):
+        img = pygame.Surface((10, 10))
+        self.cache.set_max_bytes(surface_bytes(pygame.Surface((20, 20))) +
+                                 surface_bytes(img))
+        self.cache.get(img, (20, 20), 0)
+        self.cache.get(img, (20, 20), 180)
+        self.assertEqual(len(self.cache), 1)
+        self.assertTrue(self.cache.size <= self.cache.max_bytes)
+        # the older transform was evicted
+        self.cache.get(img, (20, 20), 0)
+        self.assertEqual(self.cache.misses, 3)
+
+    def test_counts_originals(self):
+        # originals are kept alive by the keys, so they count once each
+        img = pygame.Surface((100, 100))
+        self.cache.get(img, (10, 10), 0)
+        self.cache.get(img, (10, 10), 90)
+        small = surface_bytes(pygame.Surface((10, 10)))
+        self.assertEqual(self.cache.size, surface_bytes(img) + 2 * small)
+        self.cache.set_max_bytes(surface_bytes(img) + 3 * small)
+        for i in range(3):
+            self.cache.get(pygame.Surface((100, 100)), (10, 10), 0)
+        # only the last fresh original and its transform still fit
+        self.assertEqual(len(self.cache), 1)
+        self.assertTrue(self.cache.size <= self.cache.max_bytes)
+        self.cache.clear()
+        self.assertEqual(self.cache.size, 0)
+
+    def test_shared_between_sprites(self):
+        img = pygame.Surface((10, 10))
+        s1 = Sprite()
+        s1.transform_cache = self.cache
+        s1.set_image(img)
+        s2 = Sprite()
+        s2.transform_cache = self.cache
+        s2.set_image(img)
+        s1.rotate_to(45)
+        s2.rotate_to(45)
+        self.assertTrue(s1.image is s2.image)
+        self.assertEqual(self.cache.hits, 1)
+
+
+class AssetManagerTests(unittest.TestCase):
+    def setUp(self):
+        data_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                'demos', 'data')
+        self.assets = AssetManager(data_dir, max_images=2)
+
+    def test_shared(self):
+        s1 = Sprite()
+        s1.assets = self.assets
+        s1.load_image("ball.png", -1)
+        s2 = Sprite()
+        s2.assets = self.assets
+        s2.load_image("ball.png", -1)
+        self.assertTrue(s1.image is s2.image)
+        self.assertEqual(s1.rect.size, s1.image.get_size())
+        self.assertEqual(s1.image.get_colorkey(), s1.image.get_at((0, 0)))
+        self.assertEqual((self.assets.hits, self.assets.misses), (1, 1))
+        other = self.assets.load_image("ball.png")
+        self.assertFalse(other is s1.image)
+
+    def test_eviction(self):
+        ball = self.assets.load_image("ball.png")
+        self.assets.load_image("teddy.png")
+        self.assets.load_image("button.png")
+        self.assertEqual(len(self.assets), 2)
+        self.assertFalse(self.assets.load_image("ball.png") is ball)
+        self.assertEqual(self.assets.misses, 4)
+
+
+class AnimationTests(unittest.TestCase):
+    def setUp(self):
+        self.image = pygame.Surface((30, 20))
+        for (i, color) in enumerate(('red', 'green', 'blue')):
+            self.image.fill(pygame.Color(color), (i * 10, 0, 10, 10))
+        self.sheet = SpriteSheet(self.image, (10, 10))
+
+    def test_sheet(self):
+        self.assertEqual(len(self.sheet), 6)
+        self.assertTrue(self.sheet[1].get_parent() is self.image)
+        self.assertEqual(self.sheet[2].get_at((0, 0)), pygame.Color('blue'))
+        sheet = SpriteSheet(self.image, rects=[(5, 0, 10, 10)])
+        self.assertEqual(sheet[0].get_offset(), (5, 0))
+        self.assertRaises(ValueError, SpriteSheet, self.image)
+
+    def test_animated(self):
+        cache = TransformCache()
+        s = AnimatedSprite(self.sheet[:3])
+        s.transform_cache = cache
+        s.move_to((5, 5))
+        s.frame_delay = 2
+        s.update()
+        self.assertTrue(s.image is self.sheet[0])
+        s.update()
+        self.assertTrue(s.image is self.sheet[1])
+        self.assertEqual(s.rect, Rect(5, 5, 10, 10))
+        s.set_frame(5)
+        self.assertTrue(s.image is self.sheet[2])
+        self.assertEqual(cache.misses, 0)
+        s.scale_to(2)
+        s.next_frame()
+        s.set_frame(2)
+        self.assertEqual(s.rect, Rect(5, 5, 20, 20))
+        self.assertEqual((cache.hits, cache.misses), (1, 2))
+
+    def test_animated_empty(self):
+        s = AnimatedSprite([])
+        s.update()
+        s.next_frame()
+        self.assertEqual(s.frame, 0)
+        self.assertTrue(s.image is None)
+
+
 class AggregatedSpriteTests(unittest.TestCase):
     def setUp(self):
         self.s = AggregatedSprite()
@@ -173,6 +458,707 @@ class AggregatedSpriteTests(unittest.TestCase):
         self.s.scale_by(2)
         self.assertEqual(s1.rect.size, (50, 50))
         self.assertEqual(s2.rect.size, (115, 115))
+        # batched changes reach the children on exit
+        with self.s.batch():
+            self.s.scale_to(1)
+            self.s.move_to((0, 0))
+            self.assertEqual(s1.rect.size, (50, 50))
+        self.assertEqual(s1.rect, Rect(1, 3, 10, 10))
+        self.assertEqual(s2.rect, Rect(4, 6, 23, 23))
+
+    def test_flattened(self):
+        s1 = Sprite()
+        s1.set_image(pygame.Surface((10, 10)))
+        s1.image.fill(pygame.Color('red'))
+        s1.move_to((0, 0))
+        s2 = Sprite()
+        s2.set_image(pygame.Surface((10, 10)))
+        s2.image.fill(pygame.Color('blue'))
+        s2.move_to((20, 0))
+        self.s.add_sprite(s1)
+        self.s.add_sprite(s2)
+        self.s.set_flattened(True)
+        surface = pygame.Surface((50, 50))
+        self.assertEqual(self.s.draw(surface), Rect(0, 0, 30, 10))
+        composite = self.s.visible_parts()[0][0]
+        # moves shift the composite without touching the children
+        self.s.move_to((5, 5))
+        self.s.move_by((1, 1))
+        self.assertEqual(s1.rect.topleft, (0, 0))
+        surface.fill(pygame.Color('white'))
+        self.assertEqual(self.s.draw(surface), Rect(6, 6, 30, 10))
+        self.assertEqual(surface.get_at((7, 7)), pygame.Color('red'))
+        self.assertEqual(surface.get_at((17, 7)), pygame.Color('white'))
+        self.assertEqual(surface.get_at((27, 7)), pygame.Color('blue'))
+        self.assertTrue(self.s.visible_parts()[0][0] is composite)
+        # other changes reach the children and refresh the composite
+        self.s.scale_to(2)
+        self.assertEqual(s1.rect, Rect(6, 6, 20, 20))
+        self.assertEqual(self.s.draw(surface), Rect(6, 6, 40, 20))
+        self.assertFalse(self.s.visible_parts()[0][0] is composite)
+        self.s.move_by((1, 1))
+        self.s.set_flattened(False)
+        self.assertEqual(s2.rect, Rect(27, 7, 20, 20))
+
+
+class GroupTests(unittest.TestCase):
+    def setUp(self):
+        self.sprites = [Sprite() for i in range(4)]
+        self.group = Group(self.sprites)
+
+    def test_len(self):
+        self.assertEqual(len(self.group), 4)
+        self.assertTrue(self.group)
+        self.group.empty()
+        self.assertEqual(len(self.group), 0)
+        self.assertFalse(self.group)
+
+    def test_layer_order(self):
+        s1, s2, s3, s4 = self.sprites
+        self.assertEqual(self.group.sprites(), [s1, s2, s3, s4])
+        s1.layer = 2
+        s3.layer = 1
+        self.assertEqual(self.group.sprites(), [s2, s4, s3, s1])
+        s2.layer = 1
+        self.assertEqual(self.group.sprites(), [s4, s3, s2, s1])
+        self.group.remove(s3)
+        self.assertEqual(self.group.sprites(), [s4, s2, s1])
+        s5 = Sprite()
+        s5.layer = 1
+        self.group.add(s5)
+        self.assertEqual(list(self.group), [s4, s2, s5, s1])
+
+    def test_change_layer(self):
+        s1, s2, s3, s4 = self.sprites
+        other = Group(s4, s1)
+        self.group.change_layer(s1, 5)
+        self.assertEqual(s1.layer, 5)
+        self.assertEqual(self.group.sprites(), [s2, s3, s4, s1])
+        self.assertEqual(other.sprites(), [s4, s1])
+        self.group.change_layer(s4, -1)
+        self.group.change_layer(s1, 0)
+        self.assertEqual(self.group.sprites(), [s4, s2, s3, s1])
+        self.assertEqual(other.sprites(), [s4, s1])
+        self.assertEqual(self.group._layer_order, [-1, 0])
+
+    def test_same_layer(self):
+        s1, s2, s3, s4 = self.sprites
+        self.group.sprites()
+        spritelist = self.group._spritelist
+        s1.layer = 0
+        self.group.change_layer(s2, 0)
+        self.assertTrue(self.group._spritelist is spritelist)
+        self.assertEqual(self.group.sprites(), [s1, s2, s3, s4])
+
+    def test_layer_before_init(self):
+        for base in (Sprite, SlotSprite):
+            class Early(base):
+                __slots__ = ()
+
+                def __init__(self, *groups):
+                    self.layer = 2
+                    base.__init__(self, *groups)
+
+            spr = Early(self.group)
+            self.assertEqual(spr.layer, 0)
+            self.assertTrue(spr in self.group)
+
+    def test_layer_buckets(self):
+        sprites = [Sprite() for i in range(50)]
+        self.group.add_many(sprites)
+        sprites = self.sprites + sprites
+        for i in range(200):
+            sprites[(i * 7) % len(sprites)].layer = (i * 13) % 5
+        expected = sorted(sprites, key=self.group._sort_key)
+        self.assertEqual(self.group.sprites(), expected)
+        self.assertEqual([spr.layer for spr in expected],
+                         sorted(spr.layer for spr in sprites))
+
+    def test_add_many(self):
+        s1, s2, s3, s4 = self.sprites
+        s2.layer = 1
+        new = [Sprite() for i in range(10)]
+        new[0].layer = 1
+        new[1].layer = -1
+        self.group.add_many(iter(new + [s1, new[2]]))
+        self.assertEqual(len(self.group), 14)
+        self.assertEqual(self.group.sprites(),
+                         [new[1], s1, s3, s4] + new[2:] + [s2, new[0]])
+        self.assertTrue(new[0].alive())
+        self.group.remove_many(new[1:])
+        self.assertEqual(self.group.sprites(), [s1, s3, s4, s2, new[0]])
+        self.assertFalse(new[1].alive())
+        self.group.remove_many([s1, new[0]])
+        self.assertEqual(self.group.sprites(), [s3, s4, s2])
+
+        other = Group()
+        s1.add_many([self.group, other, other])
+        self.assertEqual(len(s1.groups()), 2)
+        self.assertTrue(s1 in other)
+        s1.remove_many([other])
+        self.assertEqual(s1.groups(), [self.group])
+
+    def test_set_operations(self):
+        s1, s2, s3, s4 = self.sprites
+        s1.layer = 1
+        other = Group(s4, s1, s2)
+        self.assertEqual(self.group.intersection(other).sprites(),
+                         [s2, s4, s1])
+        self.assertEqual(self.group.difference(other).sprites(), [s3])
+        self.assertEqual(other.difference(self.group).sprites(), [])
+        s5 = Sprite()
+        union = other.union(Group(s5), self.group)
+        self.assertEqual(union.sprites(), [s4, s2, s5, s3, s1])
+        self.assertTrue(isinstance(union, Group))
+        self.assertTrue(other.issubset(self.group))
+        self.assertFalse(self.group.issubset(other))
+        self.assertTrue(self.group.issuperset(other))
+        self.assertTrue(other in self.group)
+        self.assertFalse(Group() in self.group)
+        self.assertFalse(Group(s5) in self.group)
+        self.assertTrue(self.group.has(s1, [s2, other]))
+
+    def test_draw(self):
+        class Outlined(Sprite):
+            def draw(self, surface):
+                return surface.fill(pygame.Color('green'), self.rect)
+
+        screen = pygame.Surface((50, 50))
+        s1, s2, s3, s4 = self.sprites
+        for (spr, color) in ((s1, 'red'), (s2, 'blue'), (s4, 'white')):
+            spr.set_image(pygame.Surface((10, 10)))
+            spr.image.fill(pygame.Color(color))
+            spr.move_to((0, 0))
+        self.group.remove(s3)
+        s3 = Outlined()
+        s3.rect = Rect(5, 5, 10, 10)
+        s3.layer = 1
+        s4.layer = 2
+        s2.make_invisible()
+        self.group.add(s3)
+        self.group.draw(screen)
+        self.assertEqual(screen.get_at((2, 2)), pygame.Color('white'))
+        self.assertEqual(screen.get_at((12, 12)), pygame.Color('green'))
+        self.assertEqual(self.group.spritedict[s1], Rect(0, 0, 10, 10))
+        self.assertEqual(self.group.spritedict[s2], 0)
+        self.assertEqual(self.group.spritedict[s3], Rect(5, 5, 10, 10))
+
+    def test_prepare_transforms(self):
+        cache = TransformCache()
+        img = pygame.Surface((10, 10))
+        for (i, spr) in enumerate(self.sprites):
+            spr.transform_cache = cache
+            spr.set_image(img)
+            spr.move_to((i, i))
+        s4 = self.sprites[3]
+        s4.set_rotation_steps(4)
+        with ThreadPoolExecutor(2) as executor:
+            with self.group.batch(executor):
+                for (i, spr) in enumerate(self.sprites):
+                    spr.scale_to(2)
+                    spr.rotate_to(90 * (i % 2))
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.misses, 0)
+        self.assertEqual(cache.hits, 3)
+        atlas = rotation_atlas(img, (20, 20), 4)
+        self.assertTrue(s4.image is atlas.frames[1])
+        for spr in self.sprites:
+            self.assertEqual(spr.rect.size, (20, 20))
+
+    def test_culling(self):
+        updated = []
+
+        class Tracked(Sprite):
+            def update(self):
+                updated.append(self)
+
+        screen = pygame.Surface((50, 50))
+        inside = Tracked()
+        inside.set_image(pygame.Surface((10, 10)))
+        inside.move_to((45, 45))
+        outside = Tracked()
+        outside.set_image(pygame.Surface((10, 10)))
+        outside.move_to((40, 40))
+        group = Group(inside, outside)
+        group.draw(screen)
+        self.assertEqual(group.spritedict[outside], Rect(40, 40, 10, 10))
+        outside.move_to((60, 0))
+        group.draw(screen)
+        self.assertEqual(group.spritedict[outside], 0)
+        self.assertEqual(group.spritedict[inside], Rect(45, 45, 5, 5))
+        group.viewport = (0, 0, 20, 20)
+        group.draw(screen)
+        self.assertEqual(group.spritedict[inside], 0)
+        group.viewport = None
+        group.draw(screen)
+        group.update()
+        self.assertEqual(updated, [inside, outside])
+        del updated[:]
+        group.cull_update = True
+        group.update()
+        self.assertEqual(updated, [inside])
+
+
+class SpatialIndexTests(unittest.TestCase):
+    def setUp(self):
+        self.sprites = []
+        for i in range(10):
+            spr = Sprite()
+            spr.set_image(pygame.Surface((10, 10)))
+            spr.move_to((i * 30, i * 30))
+            self.sprites.append(spr)
+        self.plain = Group(self.sprites)
+        self.indexed = Group(self.sprites)
+        self.indexed.set_spatial_index(SpatialHash(16))
+
+    def check_queries(self):
+        for group in (self.plain, self.indexed):
+            self.assertEqual(group.sprites_in_rect((25, 25, 40, 40)),
+                             self.sprites[1:3])
+            self.assertEqual(group.sprites_at((35, 35)), [self.sprites[1]])
+            self.assertEqual(group.sprites_at((15, 15)), [])
+            self.assertEqual(group.nearest((100, 100), 2),
+                             [self.sprites[3], self.sprites[4]])
+
+    def test_queries(self):
+        self.check_queries()
+
+    def test_follows_changes(self):
+        s0 = self.sprites[0]
+        s0.move_to((200, 200))
+        self.assertEqual(self.indexed.sprites_at((5, 5)), [])
+        self.assertEqual(self.indexed.sprites_at((205, 205)), [s0])
+        s0.scale_to(3)
+        self.assertEqual(self.indexed.sprites_at((225, 225)), [s0])
+        self.indexed.remove(s0)
+        self.assertEqual(self.indexed.sprites_at((205, 205)), [])
+        self.assertEqual(len(self.indexed.spatial_index), 9)
+
+    def test_layer_order(self):
+        s1, s2 = self.sprites[1:3]
+        s2.move_to((30, 30))
+        s1.layer = 1
+        self.assertEqual(self.indexed.sprites_at((35, 35)), [s2, s1])
+        self.assertEqual(self.plain.sprites_at((35, 35)), [s2, s1])
+
+class DirtyGroupTests(unittest.TestCase):
+    def setUp(self):
+        self.screen = pygame.Surface((100, 100))
+        self.bgd = pygame.Surface((100, 100))
+        self.bgd.fill(pygame.Color('white'))
+        self.s1 = Sprite()
+        self.s1.set_image(pygame.Surface((10, 10)))
+        self.s1.image.fill(pygame.Color('red'))
+        self.s1.move_to((0, 0))
+        self.s2 = Sprite()
+        self.s2.set_image(pygame.Surface((10, 10)))
+        self.s2.image.fill(pygame.Color('blue'))
+        self.s2.move_to((50, 50))
+        self.group = DirtyGroup(self.s1, self.s2)
+
+    def test_draw_only_changes(self):
+        rects = self.group.draw(self.screen, self.bgd)
+        self.assertEqual(rects, [Rect(0, 0, 10, 10), Rect(50, 50, 10, 10)])
+        self.assertFalse(self.s1.dirty)
+        self.assertEqual(self.group.draw(self.screen, self.bgd), [])
+        self.s1.move_to((5, 0))
+        self.assertEqual(self.group.draw(self.screen, self.bgd),
+                         [Rect(0, 0, 15, 10)])
+        self.assertEqual(self.screen.get_at((2, 2)), pygame.Color('white'))
+        self.assertEqual(self.screen.get_at((7, 2)), pygame.Color('red'))
+
+    def test_redraw_overlapping(self):
+        self.group.draw(self.screen, self.bgd)
+        self.s2.layer = 1
+        self.s2.move_to((5, 5))
+        self.group.draw(self.screen, self.bgd)
+        self.assertEqual(self.screen.get_at((7, 7)), pygame.Color('blue'))
+        self.s1.make_invisible()
+        rects = self.group.draw(self.screen, self.bgd)
+        self.assertEqual(rects, [Rect(0, 0, 10, 10)])
+        self.assertEqual(self.screen.get_at((2, 2)), pygame.Color('white'))
+        self.assertEqual(self.screen.get_at((7, 7)), pygame.Color('blue'))
+
+    def test_layer_change(self):
+        self.s2.move_to((5, 5))
+        self.group.draw(self.screen, self.bgd)
+        self.assertEqual(self.screen.get_at((7, 7)), pygame.Color('blue'))
+        self.s1.layer = 1
+        self.assertEqual(self.group.draw(self.screen, self.bgd),
+                         [Rect(0, 0, 10, 10)])
+        self.assertEqual(self.screen.get_at((7, 7)), pygame.Color('red'))
+        self.assertEqual(self.screen.get_at((12, 12)), pygame.Color('blue'))
+
+    def test_custom_draw(self):
+        class Outlined(Sprite):
+            def draw(self, surface):
+                return surface.fill(pygame.Color('green'), self.rect)
+
+        s3 = Outlined()
+        s3.set_image(self.s1.image)
+        s3.move_to((20, 0))
+        self.group.add(s3)
+        self.group.draw(self.screen, self.bgd)
+        self.assertEqual(self.screen.get_at((25, 5)), pygame.Color('green'))
+        self.s1.move_to((15, 5))
+        self.group.draw(self.screen, self.bgd)
+        self.assertEqual(self.screen.get_at((17, 7)), pygame.Color('red'))
+        self.assertEqual(self.screen.get_at((22, 7)), pygame.Color('green'))
+        self.assertEqual(self.screen.get_at((25, 2)), pygame.Color('green'))
+
+    def test_full_redraw(self):
+        self.group.draw(self.screen, self.bgd)
+        self.s1.move_to((20, 20))
+        self.s1.scale_to(8)
+        self.assertEqual(self.group.draw(self.screen, self.bgd),
+                         [Rect(0, 0, 100, 100)])
+        self.assertEqual(self.screen.get_at((5, 5)), pygame.Color('white'))
+        self.assertEqual(self.screen.get_at((55, 55)), pygame.Color('blue'))
+        self.assertEqual(self.screen.get_at((25, 25)), pygame.Color('red'))
+        sprites = []
+        for i in range(DirtyGroup.redraw_rects + 1):
+            spr = Sprite()
+            spr.set_image(pygame.Surface((1, 1)))
+            spr.move_to((i % 100, 99))
+            sprites.append(spr)
+        group = DirtyGroup(sprites)
+        self.assertEqual(group.draw(self.screen), [Rect(0, 0, 100, 100)])
+        self.assertEqual(len(group.draw(self.screen)), 0)
+        sprites[0].move_by((0, -1))
+        self.assertEqual(group.draw(self.screen), [Rect(0, 98, 1, 2)])
+
+    def test_removed_sprite(self):
+        self.group.draw(self.screen, self.bgd)
+        self.group.remove(self.s2)
+        self.assertEqual(self.group.draw(self.screen, self.bgd),
+                         [Rect(50, 50, 10, 10)])
+        self.assertEqual(self.screen.get_at((55, 55)), pygame.Color('white'))
+
+    def test_merge_rects(self):
+        rects = [Rect(0, 0, 10, 10), Rect(20, 20, 5, 5), Rect(5, 5, 10, 10),
+                 Rect(0, 0, 0, 0)]
+        self.assertEqual(merge_rects(rects, 0.25),
+                         [Rect(0, 0, 15, 15), Rect(20, 20, 5, 5)])
+        # without waste, overlapping rects are kept as they are
+        self.assertEqual(merge_rects(rects, 0),
+                         [Rect(0, 0, 10, 10), Rect(5, 5, 10, 10),
+                          Rect(20, 20, 5, 5)])
+
+    def check_merged(self, rects, merged):
+        covered = set()
+        for r in rects:
+            covered.update((x, y) for x in range(r.left, r.right)
+                           for y in range(r.top, r.bottom))
+        pixels = set()
+        for r in merged:
+            self.assertEqual(r.collidelistall(merged), [merged.index(r)])
+            pixels.update((x, y) for x in range(r.left, r.right)
+                          for y in range(r.top, r.bottom))
+        self.assertTrue(covered <= pixels)
+
+    def test_merge_overlapping(self):
+        cross = [Rect(0, 45, 100, 10), Rect(45, 0, 10, 100)]
+        self.assertEqual(merge_rects(cross, 0.25), cross[::-1])
+        self.assertEqual(merge_rects(cross), [Rect(0, 0, 100, 100)])
+        # a union reaching a rect the sweep has passed
+        rects = [Rect(0, 20, 5, 5), Rect(2, 0, 10, 10), Rect(8, 8, 4, 20)]
+        self.assertEqual(merge_rects(rects), [Rect(0, 0, 12, 28)])
+        scattered = [Rect((i * 37) % 200, (i * 91) % 200, 12, 9)
+                     for i in range(300)]
+        self.check_merged(scattered, merge_rects(scattered))
+
+    def test_merge_adjacent(self):
+        rects = [Rect(0, 0, 10, 10), Rect(10, 0, 10, 10), Rect(20, 5, 10, 10)]
+        self.assertEqual(merge_rects(rects, 0),
+                         [Rect(0, 0, 20, 10), Rect(20, 5, 10, 10)])
+        self.assertEqual(merge_rects(rects, 0.4), [Rect(0, 0, 30, 15)])
+        # separate rects are never merged
+        self.assertEqual(len(merge_rects([Rect(0, 0, 5, 5),
+                                          Rect(6, 0, 5, 5)])), 2)
+
+    def test_clear(self):
+        screen = pygame.Surface((100, 100))
+        group = Group(self.s1, self.s2)
+        group.draw(screen)
+        self.s2.move_to((5, 5))
+        group.draw(screen)
+        group.remove(self.s1)
+        self.assertEqual(group.clear(screen, self.bgd),
+                         [Rect(5, 5, 10, 10), Rect(0, 0, 10, 10)])
+        self.assertEqual(screen.get_at((12, 12)), pygame.Color('white'))
+        group.add(self.s1)
+        group.draw(screen)
+        group.remove(self.s2)
+        group.clear_waste = 0.25
+        self.assertEqual(group.clear(screen, self.bgd), [Rect(0, 0, 15, 15)])
+
+
+@unittest.skipIf(numpy is None, "numpy is not available")
+class SpriteArrayTests(unittest.TestCase):
+    def setUp(self):
+        self.sprites = []
+        for i in range(4):
+            spr = Sprite()
+            spr.set_image(pygame.Surface((10, 10)))
+            spr.move_to((i * 10, 0))
+            self.sprites.append(spr)
+        self.sprites[3].anchor = ANCHOR_CENTER
+        self.array = SpriteArray(self.sprites)
+
+    def test_move(self):
+        self.array.move_by((1.5, 2))
+        self.array.move_to((100, 100), numpy.array([False, True,
+                                                    False, False]))
+        self.array.move_by([(1, 1), (2, 2)], [2, 3])
+        self.assertEqual(self.sprites[0].position, (0, 0))
+        self.array.write()
+        self.assertEqual(self.sprites[0].position, (1.5, 2))
+        self.assertEqual(self.sprites[0].rect.topleft, (2, 2))
+        self.assertEqual(self.sprites[1].rect.topleft, (100, 100))
+        self.assertEqual(self.sprites[2].position, (22.5, 3))
+        self.assertEqual(self.sprites[3].rect.topleft, (29, -1))
+        self.assertTrue(self.sprites[0].dirty)
+
+    def test_transforms(self):
+        self.array.scale[[0, 3]] = 2
+        self.array.visible[1] = False
+        self.array.write()
+        self.assertEqual(self.sprites[0].rect.size, (20, 20))
+        self.assertEqual(self.sprites[3].rect.topleft, (20, -10))
+        self.assertFalse(self.sprites[1].visible)
+
+    def test_draw(self):
+        screen = pygame.Surface((50, 50))
+        self.array.visible[0] = False
+        self.array.move_by((5, 5))
+        rects = self.array.draw(screen)
+        self.assertEqual(rects, [Rect(15, 5, 10, 10), Rect(25, 5, 10, 10),
+                                 Rect(30, 0, 10, 10)])
+
+
+class FrameStatsTests(unittest.TestCase):
+    def tearDown(self):
+        disable_stats()
+
+    def test_counters(self):
+        frames = []
+        stats = enable_stats(frames.append)
+        s = Sprite()
+        s.transform_cache = None
+        s.set_image(pygame.Surface((10, 10)))
+        s.move_to((0, 0))
+        s.move_by((1, 1))
+        s.scale_to(2)
+        s.rotate_to(90)
+        group = Group(s)
+        screen = pygame.Surface((50, 50))
+        group.clear(screen, screen.copy())
+        group.update()
+        group.draw(screen)
+        group.clear(screen, screen.copy())
+        self.assertEqual(stats.hooks, 5)
+        self.assertEqual((stats.scales, stats.rotates), (2, 1))
+        self.assertEqual(stats.blits, 2)
+        self.assertTrue(stats.draw_time > 0)
+        snapshot = stats.end_frame()
+        self.assertEqual(frames, [snapshot])
+        self.assertEqual(snapshot['hooks'], 5)
+        self.assertEqual(stats.hooks, 0)
+        disable_stats()
+        s.move_by((1, 1))
+        self.assertEqual(stats.hooks, 0)
+        self.assertTrue(s.dirty)
+
+    def test_enabled_during_update(self):
+        class Toggle(Sprite):
+            def update(self):
+                enable_stats()
+        s = Toggle()
+        s.set_image(pygame.Surface((5, 5)))
+        s.move_to((0, 0))
+        group = Group(s)
+        group.update()
+        group.draw(pygame.Surface((10, 10)))
+        disable_stats()
+        group.clear(pygame.Surface((10, 10)), pygame.Surface((10, 10)))
+
+    def test_batch_unchanged(self):
+        stats = enable_stats()
+        s = Sprite()
+        s.set_image(pygame.Surface((10, 10)))
+        s.dirty = False
+        with s.batch():
+            s.move_to((1, 1))
+            s.scale_to(2)
+            self.assertFalse(s.dirty)
+        self.assertTrue(s.dirty)
+        self.assertEqual(stats.hooks, 3)
+
+
+class CollisionTests(unittest.TestCase):
+    def make(self, pos, size=(10, 10)):
+        spr = Sprite()
+        spr.set_image(pygame.Surface(size))
+        spr.move_to(pos)
+        return spr
+
+    def setUp(self):
+        self.a1 = self.make((0, 0))
+        self.a2 = self.make((100, 100))
+        self.b1 = self.make((5, 5))
+        self.b2 = self.make((50, 0), (60, 10))
+        self.b3 = self.make((105, 95))
+        self.ga = Group(self.a1, self.a2)
+        self.gb = Group(self.b1, self.b2, self.b3)
+
+    def test_spritecollide(self):
+        self.assertEqual(spritecollide(self.a1, self.gb), [self.b1])
+        self.gb.set_spatial_index(SpatialHash(16))
+        self.assertEqual(spritecollide(self.a2, self.gb), [self.b3])
+        self.assertEqual(spritecollide(self.a2, self.gb,
+                                       collided=lambda a, b: False), [])
+        spritecollide(self.a1, self.gb, dokill=True)
+        self.assertFalse(self.b1.alive())
+
+    def test_collide_any(self):
+        self.assertTrue(collide_any(self.a1, self.gb) is self.b1)
+        self.assertTrue(collide_any(self.make((300, 300)), self.gb) is None)
+        self.assertTrue(collide_any(self.a2, self.gb,
+                                    lambda a, b: False) is None)
+
+    def test_groupcollide(self):
+        self.assertEqual(set(groupcollide(self.ga, self.gb)),
+                         set([(self.a1, self.b1), (self.a2, self.b3)]))
+        # a wide rect starting far to the left is still found
+        wide = self.make((60, 0))
+        self.assertEqual(groupcollide(Group(wide), self.gb),
+                         [(wide, self.b2)])
+        groupcollide(self.ga, self.gb, dokillb=True)
+        self.assertEqual(len(self.gb), 1)
+
+    def test_sweep_axis(self):
+        # a tall, narrow field is swept along y
+        ga = Group([self.make(((i * 7) % 50, i * 13)) for i in range(100)])
+        gb = Group([self.make(((i * 11) % 50, i * 17)) for i in range(100)])
+        sweep = CollisionSweep()
+        pairs = sweep.pairs(ga, gb)
+        self.assertEqual(sweep.axis, 'y')
+        expected = set((a, b) for a in ga for b in gb
+                       if a.rect.colliderect(b.rect))
+        self.assertTrue(expected)
+        self.assertEqual(set(pairs), expected)
+        self.assertEqual(len(pairs), len(expected))
+
+    def test_sweep_incremental(self):
+        sweep = CollisionSweep()
+        self.assertEqual(len(sweep.pairs(self.ga, self.gb)), 2)
+        self.b1.move_to((200, 200))
+        self.b3.move_to((0, 0))
+        self.gb.add(self.make((100, 100)))
+        self.gb.remove(self.b2)
+        pairs = sweep.pairs(self.ga, self.gb)
+        self.assertEqual(len(pairs), 2)
+        self.assertTrue((self.a1, self.b3) in pairs)
+        self.assertFalse(self.b2 in sweep._order)
+
+
+class MaskTests(unittest.TestCase):
+    def make(self, pos):
+        # a square whose left half is transparent
+        img = pygame.Surface((10, 10), pygame.SRCALPHA)
+        img.fill((255, 0, 0, 255), (5, 0, 5, 10))
+        spr = Sprite()
+        spr.mask_cache = self.cache
+        spr.set_image(img)
+        spr.move_to(pos)
+        return spr
+
+    def setUp(self):
+        self.cache = MaskCache()
+
+    def test_collide_mask(self):
+        s1 = self.make((0, 0))
+        s2 = self.make((3, 0))
+        s3 = self.make((5, 0))
+        self.assertEqual(collide_mask(s1, s2), (8, 0))
+        self.assertEqual(collide_mask(s1, s3), None)
+        # disjoint rects are rejected without building masks
+        self.cache.clear()
+        self.assertEqual(collide_mask(s1, self.make((50, 50))), None)
+        self.assertEqual(self.cache.misses, 0)
+        self.assertEqual(spritecollide(s1, Group(s2, s3),
+                                       collided=collide_mask), [s2])
+
+    def test_cached_per_transform(self):
+        s1 = self.make((0, 0))
+        s2 = Sprite()
+        s2.mask_cache = self.cache
+        s2.set_image(s1.original)
+        s1.rotate_to(90)
+        s2.rotate_to(90)
+        self.assertTrue(s1.get_mask() is s2.get_mask())
+        self.assertEqual(self.cache.misses, 1)
+        # the rotated mask has the opaque half at the top
+        self.assertEqual(s1.get_mask().get_at((0, 0)), 1)
+        self.assertEqual(s1.get_mask().get_at((0, 9)), 0)
+        s1.rotate_to(0)
+        self.assertEqual(s1.get_mask().get_at((0, 0)), 0)
+        self.assertEqual(self.cache.misses, 2)
+
+
+@unittest.skipIf(numpy is None, "numpy is not available")
+class TweenerTests(unittest.TestCase):
+    def setUp(self):
+        self.tweener = Tweener()
+        self.s1 = Sprite()
+        self.s1.set_image(pygame.Surface((10, 10)))
+        self.s1.move_to((0, 0))
+
+    def test_position(self):
+        ended = []
+        self.tweener.tween(self.s1, 'position', (100, 50), 10,
+                           callback=ended.append)
+        self.tweener.step(5)
+        self.assertEqual(self.s1.position, (50, 25))
+        self.assertEqual(self.s1.rect.topleft, (50, 25))
+        self.assertEqual(self.tweener.step(10), 1)
+        self.assertEqual(self.s1.position, (100, 50))
+        self.assertEqual(ended, [self.s1])
+        self.assertEqual(len(self.tweener), 0)
+
+    def test_easing(self):
+        self.tweener.tween(self.s1, 'rotate', 100, 10, 'quad_in')
+        self.tweener.step(5)
+        self.assertEqual(self.s1.rotate, 25)
+        for name in easings:
+            ends = easings[name](numpy.array([0.0, 1.0]))
+            self.assertTrue(numpy.allclose(ends, [0, 1]), name)
+        self.assertRaises(ValueError, self.tweener.tween, self.s1,
+                          'rotate', 0, 1, 'bounce')
+
+    def test_batched_write(self):
+        cache = TransformCache()
+        self.s1.transform_cache = cache
+        self.tweener.tween(self.s1, 'scale', 3, 4)
+        self.tweener.tween(self.s1, 'rotate', 180, 4)
+        self.tweener.step(2)
+        self.assertEqual((self.s1.scale, self.s1.rotate), (2, 90))
+        self.assertEqual(self.s1.rect.size, (20, 20))
+        self.assertEqual(cache.misses, 1)
+
+    def test_cancel(self):
+        s2 = Sprite()
+        s2.set_image(pygame.Surface((10, 10)))
+        s2.move_to((0, 0))
+        self.tweener.tween(self.s1, 'scale', 3, 4)
+        self.tweener.tween(self.s1, 'position', (8, 8), 4)
+        self.tweener.tween(s2, 'position', (8, 8), 4)
+        self.tweener.cancel(self.s1, 'scale')
+        self.assertEqual(len(self.tweener), 2)
+        self.tweener.cancel(self.s1)
+        self.tweener.step(2)
+        self.assertEqual(self.s1.position, (0, 0))
+        self.assertEqual(s2.position, (4, 4))
 
 
 if __name__ == '__main__':